@@ -1,11 +1,44 @@
+import importlib
 
-from .chirp import ChirpSong
-from .rchirp import RChirpSong
-from .mchirp import MChirpSong
-from .midi import MIDI
-from .lilypond import Lilypond
-from .goat_tracker import GoatTracker
-from .ml64 import ML64
-from .c128_basic import C128Basic
-from .sid import SID
-from .one_pass_compress import OnePassGlobal, OnePassLeftToRight
+# The public classes are imported on first use (PEP 562), so that importing a single submodule
+# such as chiptunesak.constants doesn't drag in every converter (MIDI, SID emulation, etc.)
+_exports = {
+    'ChirpSong': 'chirp',
+    'RChirpSong': 'rchirp',
+    'MChirpSong': 'mchirp',
+    'MIDI': 'midi',
+    'Lilypond': 'lilypond',
+    'GoatTracker': 'goat_tracker',
+    'ML64': 'ml64',
+    'C128Basic': 'c128_basic',
+    'SID': 'sid',
+    'OnePassGlobal': 'one_pass_compress',
+    'OnePassLeftToRight': 'one_pass_compress',
+}
+
+# Submodules that "from chiptunesak import *" has always bound; they are imported on demand too
+_submodules = (
+    'base', 'byte_util', 'c128_basic', 'chirp', 'constants', 'emulator_6502', 'errors', 'gen_prg',
+    'goat_tracker', 'key', 'lilypond', 'mchirp', 'midi', 'ml64', 'one_pass_compress', 'rchirp', 'sid',
+    'thin_c64_emulator',
+)
+
+__all__ = list(_exports) + list(_submodules)
+
+
+def __getattr__(name):
+    if name in _exports:
+        value = getattr(importlib.import_module('.' + _exports[name], __name__), name)
+    else:
+        try:
+            value = importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+            raise AttributeError("module %r has no attribute %r" % (__name__, name)) from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
@@ -1,5 +1,6 @@
 import re
 import collections
+import functools
 from dataclasses import dataclass, field
 from fractions import Fraction
 from chiptunesak.errors import *
@@ -217,6 +218,25 @@ class ChiptuneSAKCompress(ChiptuneSAKBase):
 # --------------------------------------------------------------------------------------
 
 
+@functools.lru_cache(maxsize=8192)
+def limit_fraction(numerator, denominator, max_denominator):
+    """
+    Returns the closest fraction to numerator / denominator whose denominator is at most max_denominator.
+    The division is done exactly (no float round trip).  Results are cached, since the same
+    (duration, ppq) pairs come up over and over again in a song.
+
+    :param numerator: numerator, e.g. a duration in ticks
+    :type numerator: int or Fraction
+    :param denominator: denominator, e.g. ppq
+    :type denominator: int
+    :param max_denominator: largest denominator allowed in the result
+    :type max_denominator: int
+    :return: limited fraction
+    :rtype: Fraction
+    """
+    return (Fraction(numerator) / denominator).limit_denominator(max_denominator)
+
+
 def duration_to_note_name(duration, ppq, locale='US'):
     """
     Given a ppq (pulses per quarter note) convert a duration to a human readable note length,
@@ -232,10 +252,14 @@ def duration_to_note_name(duration, ppq, locale='US'):
     :return: note description
     :rtype: str
     """
-    f = Fraction(duration / ppq).limit_denominator(64)
+    f = limit_fraction(duration, ppq, 64)
     return constants.DURATIONS[locale.upper()].get(f, '<unknown>')
 
 
+# Note names for every MIDI pitch (no octave offset), indexed by note number
+_PITCH_NAMES = tuple("%s%d" % (constants.PITCHES[n % 12], n // 12 - 1) for n in range(128))
+
+
 def pitch_to_note_name(note_num, octave_offset=0):
     """
     Gets note name for a given MIDI pitch
@@ -249,6 +273,8 @@ def pitch_to_note_name(note_num, octave_offset=0):
     """
     if not 0 <= note_num <= 127:
         raise ChiptuneSAKValueError("Illegal note number %d" % note_num)
+    if octave_offset == 0:
+        return _PITCH_NAMES[note_num]
     octave = (note_num // 12) + octave_offset - 1
     pitch = note_num % 12
     return "%s%d" % (constants.PITCHES[pitch], octave)
@@ -257,6 +283,8 @@ def pitch_to_note_name(note_num, octave_offset=0):
 # Regular expression for matching note names
 note_name_format = re.compile('^([A-G])(#|##|b|bb)?(-{0,1}[0-7])$')
 
+
+@functools.lru_cache(maxsize=256)
 def note_name_to_pitch(note_name, octave_offset=0):
     """
     Returns MIDI note number for a named pitch.  C4 = 60
@@ -269,9 +297,9 @@ def note_name_to_pitch(note_name, octave_offset=0):
     :return: Midi note number
     :rtype: int
     """
-    if note_name_format.match(note_name) is None:
+    m = note_name_format.fullmatch(note_name)
+    if m is None:
         raise ChiptuneSAKValueError('Illegal note name: "%s"' % note_name)
-    m = note_name_format.match(note_name)
     note_name = m.group(1)
     accidentals = m.group(2)
     octave = int(m.group(3)) - octave_offset + 1
@@ -282,7 +310,30 @@ def note_name_to_pitch(note_name, octave_offset=0):
     return note_num
 
 
-def decompose_duration(duration, ppq, allowed_durations):
+def make_duration_table(allowed_durations, ppq):
+    """
+    Precomputes the table used by decompose_duration():  the allowed durations, longest first, each paired
+    with its length in ticks.  Build it once and pass it to decompose_duration() when decomposing many
+    durations with the same ppq.
+
+    :param allowed_durations:  Dictionary of allowed durations.  Allowed durations are expressed as fractions
+                               of a quarter note.
+    :type allowed_durations:   Dictionary (or set) of Fractions
+    :param ppq:                Ticks per quarter note.
+    :type ppq:                 int
+    :return:                   List of (ticks, duration) pairs, longest first
+    :rtype:                    list of tuple
+    """
+    table = []
+    for d in sorted(allowed_durations, reverse=True):
+        ticks = d * ppq
+        if ticks.denominator == 1:  # Keep whole tick counts as ints for fast comparisons
+            ticks = int(ticks)
+        table.append((ticks, d))
+    return table
+
+
+def decompose_duration(duration, ppq, allowed_durations, duration_table=None):
     """
     Decomposes a given duration into a sum of allowed durations.
     This function uses a greedy algorithm, which iteratively finds the largest allowed duration shorter than
@@ -295,19 +346,24 @@ def decompose_duration(duration, ppq, allowed_durations):
     :param allowed_durations:  Dictionary of allowed durations.  Allowed durations are expressed as fractions
                                of a quarter note.
     :type allowed_durations:   Dictionary (or set) of Fractions
+    :param duration_table:     Optional table from make_duration_table(allowed_durations, ppq), to avoid
+                               rebuilding it on every call
+    :type duration_table:      list of tuple
     :return:                   List of decomposed durations
     :rtype:                    list of Fraction
     """
+    if duration_table is None:
+        duration_table = make_duration_table(allowed_durations, ppq)
     ret_durations = []
-    min_allowed_duration = min(allowed_durations)
+    min_ticks = duration_table[-1][0]
     remainder = duration
     while remainder > 0:
-        if remainder < min_allowed_duration * ppq:
+        if remainder < min_ticks:
             raise ChiptuneSAKValueError("Illegal note duration %d" % duration)
-        for d in sorted(allowed_durations, reverse=True):
-            if remainder >= d * ppq:
+        for ticks, d in duration_table:
+            if remainder >= ticks:
                 ret_durations.append(d)
-                remainder -= d * ppq
+                remainder -= ticks
                 break
     return ret_durations
 
@@ -324,7 +380,7 @@ def is_triplet(note, ppq):
     :return:      True of the note is a triplet type
     :rtype:       bool
     """
-    f = Fraction(note.duration / ppq).limit_denominator(16)
+    f = limit_fraction(note.duration, ppq, 16)
     if f.denominator % 3 == 0:
         return True
     return False
@@ -344,5 +400,5 @@ def start_beat_type(time, ppq):
                   will be a multiple of 3.
     :rtype:       int
     """
-    f = Fraction(time, ppq).limit_denominator(32)
+    f = limit_fraction(time, ppq, 32)
     return f.denominator
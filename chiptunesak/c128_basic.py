@@ -1,6 +1,8 @@
 # Lower MChirp to C128 BASIC PLAY commands
 
-import collections
+import functools
+import string
+from dataclasses import dataclass
 from chiptunesak import constants
 from chiptunesak import base
 from chiptunesak import gen_prg
@@ -25,9 +27,25 @@ C128_INSTRUMENTS = {
     'xylophone': 9,     # ADSR  0, 9,  0, 0, WF 0
 }
 
-# These types are similar to standard notes and rests but with voice added
-BasicNote = collections.namedtuple('BasicNote', ['start_time', 'note_num', 'duration', 'voice'])
-BasicRest = collections.namedtuple('BasicRest', ['start_time', 'duration', 'voice'])
+
+# These types are similar to standard notes and rests but with voice added.
+# Many of them are created per measure, so they use slots rather than instance dicts.
+@dataclass(frozen=True)
+class BasicNote:
+    __slots__ = ('start_time', 'note_num', 'duration', 'voice')
+    start_time: int
+    note_num: int
+    duration: int
+    voice: int
+
+
+@dataclass(frozen=True)
+class BasicRest:
+    __slots__ = ('start_time', 'duration', 'voice')
+    start_time: int
+    duration: int
+    voice: int
+
 
 # These appear to be the only allowed note durations for C128 BASIC
 basic_durations = {
@@ -37,6 +55,7 @@ basic_durations = {
     constants.Fraction(3, 4): 'i.', constants.Fraction(1, 2): 'i',
     constants.Fraction(1, 4): 's'
 }
+basic_durations_descending = sorted(basic_durations, reverse=True)
 
 
 class C128Basic(base.ChiptuneSAKIO):
@@ -168,7 +187,7 @@ class C128Basic(base.ChiptuneSAKIO):
         else:
             rem_desc = mchirp_song.metadata.name.lower()
 
-        result.append('%d rem %s' % (current_line, rem_desc))
+        result.append(f'{current_line} rem {rem_desc}')
         current_line += 10
 
         # Tempo 1 is slowest, and 255 is fastest
@@ -179,28 +198,18 @@ class C128Basic(base.ChiptuneSAKIO):
                      / constants.ARCH[self.get_option('arch')].frame_rate / 60 / 4)
             tempo = int(round(tempo))
 
-        result.append('%d tempo %d' % (current_line, tempo))
+        result.append(f'{current_line} tempo {int(tempo)}')
 
-        current_line = 100
-        for measure_num, s in enumerate(basic_strings):
-            tmp_line = '%d %s$="%s"' % (current_line, num_to_str_name(measure_num), s)
-            if len(tmp_line) >= constants.BASIC_LINE_MAX_C128:
-                # it's ok if space removed between line number and first character
-                tmp_line = tmp_line.replace(" ", "")
-                # If the line is still too long...
-                if len(tmp_line) >= constants.BASIC_LINE_MAX_C128:
-                    raise ChiptuneSAKContentError(
-                        "C128 BASIC line too long: Line %d length %d" % (current_line, len(tmp_line)))
-            result.append(tmp_line)
-
-            current_line += 10
+        # One string variable per measure, on lines 100, 110, ...
+        result.extend([measure_string_line(100 + 10 * measure_num, measure_num, s)
+                       for measure_num, s in enumerate(basic_strings)])
 
         current_line = 7000  # data might reach line 6740
         volume = 9
         # FUTURE: For each voice, provide a way to pick (or override) the default envelopes
         instr_assign = 'u%dv1t%dv2t%dv3t%d' % \
             (volume, *(C128_INSTRUMENTS[inst] for inst in self.get_option('instruments')))
-        result.append('%d play"%s":rem init instruments' % (current_line, instr_assign))
+        result.append(f'{current_line} play"{instr_assign}":rem init instruments')
         current_line += 10
 
         # FUTURE: Using FILTER command likely out of scope, but could be added as another option:
@@ -213,21 +222,41 @@ class C128Basic(base.ChiptuneSAKIO):
         # TODO: Can later repeat a measure by PLAYing its string more than once to
         # achieve measure-level compression
         PLAYS_PER_LINE = 8
-        line_buf = []
-        for measure_num in range(len(basic_strings)):
-            if measure_num != 0 and measure_num % PLAYS_PER_LINE == 0:
-                result.append('%d %s' % (current_line, ':'.join(line_buf)))
-                line_buf = []
-                current_line += 10
-            line_buf.append("play %s$" % (num_to_str_name(measure_num)))
-
-        if len(line_buf) > 0:
-            result.append('%d %s' % (current_line, ':'.join(line_buf)))
+        plays = [f"play {num_to_str_name(measure_num)}$" for measure_num in range(len(basic_strings))]
+        for i in range(0, len(plays), PLAYS_PER_LINE):
+            result.append(f"{current_line} {':'.join(plays[i:i + PLAYS_PER_LINE])}")
             current_line += 10
 
         return '\n'.join(result)
 
 
+def measure_string_line(line_num, measure_num, s):
+    """
+    Makes the BASIC line that assigns a measure's PLAY string to its string variable
+
+    :param line_num: BASIC line number
+    :type line_num: int
+    :param measure_num: measure number, used to name the string variable
+    :type measure_num: int
+    :param s: PLAY string for the measure
+    :type s: str
+    :return: BASIC line
+    :rtype: str
+    """
+    str_name = num_to_str_name(measure_num)
+    line_num_str = str(line_num)
+    # Length of the readable line: line number, space, 2-char name, '$="', the string, '"'
+    if len(line_num_str) + len(s) + 7 < constants.BASIC_LINE_MAX_C128:
+        return f'{line_num_str} {str_name}$="{s}"'
+    # it's ok if space removed between line number and first character
+    tmp_line = f'{line_num_str}{str_name}$="{s.replace(" ", "")}"'
+    # If the line is still too long...
+    if len(tmp_line) >= constants.BASIC_LINE_MAX_C128:
+        raise ChiptuneSAKContentError(
+            "C128 BASIC line too long: Line %d length %d" % (line_num, len(tmp_line)))
+    return tmp_line
+
+
 def sort_order(c):
     """
     Sort function for measure contents.
@@ -236,23 +265,27 @@ def sort_order(c):
     :return: 3-tuple used for sorting
     :rtype: tuple
     """
-    if isinstance(c, BasicNote):
-        return (c.start_time, -c.duration, c.voice)
-    elif isinstance(c, BasicRest):
-        return (c.start_time, -c.duration, c.voice)
+    # BasicNote and BasicRest share these fields, so no type dispatch is needed
+    return (c.start_time, -c.duration, c.voice)
+
+
+# Lower-case BASIC note names (accidental before the note letter) and octaves, indexed by MIDI note number
+basic_note_names = tuple((name[::-1][1:].lower(), name[::-1][0]) for name in map(base.pitch_to_note_name, range(128)))
 
 
 def pitch_to_basic_note_name(note_num, octave_offset=0):
     """
     Gets note name for a given MIDI pitch
 
-    :return: note name string and octave number
+    :return: lower-case note name string and octave number
     :rtype: str, int
     """
-    note_name = base.pitch_to_note_name(note_num)[::-1]  # Reverse the note name
-    return note_name[1:], note_name[0]
+    if not 0 <= note_num <= 127:
+        raise ChiptuneSAKValueError("Illegal note number %d" % note_num)
+    return basic_note_names[note_num]
 
 
+@functools.lru_cache(maxsize=128)
 def duration_to_basic_name(duration, ppq):
     """
     Gets a note duration name for a given duration.
@@ -264,25 +297,72 @@ def duration_to_basic_name(duration, ppq):
     :return: C128 BASIC name for the duration
     :rtype: str
     """
-    f = constants.Fraction(duration / ppq).limit_denominator(16)
+    f = base.limit_fraction(duration, ppq, 16)
     if f not in basic_durations:
         raise ChiptuneSAKValueError("Illegal note duration %s" % str(f))
     return basic_durations[f]
 
 
+@functools.lru_cache(maxsize=512)
+def trimmed_basic_duration(duration, ppq):
+    """
+    Finds the longest duration allowed in C128 Basic that fits in the given duration
+
+    :param duration: note duration in ticks
+    :type duration: int
+    :param ppq: ppq (midi pulses per quarter note)
+    :type ppq: int
+    :return: trimmed duration in ticks, or None if the duration needs no trimming (or is too short to trim)
+    :rtype: Fraction
+    """
+    f = base.limit_fraction(duration, ppq, 8)
+    if f not in basic_durations:
+        for d in basic_durations_descending:
+            if f >= d:
+                return d * ppq
+    return None
+
+
 def trim_note_lengths(song):
     """
     Trims the note lengths in a ChirpSong to only those allowed in C128 Basic
     """
-    for i_t, t in enumerate(song.tracks):
-        for i_n, n in enumerate(t.notes):
-            f = constants.Fraction(n.duration / song.metadata.ppq).limit_denominator(8)
-            if f not in basic_durations:
-                for d in sorted(basic_durations, reverse=True):
-                    if f >= d:
-                        n.duration = d * song.metadata.ppq
-                        break
-                song.tracks[i_t].notes[i_n] = n  # Trim the note in place
+    ppq = song.metadata.ppq
+    for t in song.tracks:
+        for n in t.notes:
+            trimmed = trimmed_basic_duration(n.duration, ppq)
+            if trimmed is not None:
+                n.duration = trimmed  # Trim the note in place
+
+
+def add_basic_notes(contents, note, voice, ppq, duration_table, duration_ticks):
+    """
+    Decomposes a note into allowed BASIC durations and appends them to contents.
+    A note that is tied to a previous one becomes rests, since the previous note keeps sounding.
+    """
+    if note.tied_to:
+        add_basic_rests(contents, note, voice, ppq, duration_table, duration_ticks)
+        return
+    start_time = note.start_time
+    for d in base.decompose_duration(note.duration, ppq, basic_durations, duration_table):
+        ticks = duration_ticks[d]
+        contents.append(BasicNote(start_time, note.note_num, ticks, voice))
+        start_time += ticks
+
+
+def add_basic_rests(contents, rest, voice, ppq, duration_table, duration_ticks):
+    """
+    Decomposes a rest into allowed BASIC durations and appends them to contents.
+    """
+    start_time = rest.start_time
+    for d in base.decompose_duration(rest.duration, ppq, basic_durations, duration_table):
+        ticks = duration_ticks[d]
+        contents.append(BasicRest(start_time, ticks, voice))
+        start_time += ticks
+
+
+# Converters from measure events to BASIC events, keyed by event type.  Other events are ignored.
+basic_event_handlers = {chirp.Note: add_basic_notes, base.Rest: add_basic_rests}
 
 
 def measures_to_basic(mchirp_song):
@@ -297,6 +377,8 @@ def measures_to_basic(mchirp_song):
     last_octave = -10
     last_duration = 0
     ppq = mchirp_song.metadata.ppq
+    duration_table = base.make_duration_table(basic_durations, ppq)
+    duration_ticks = {d: ticks for ticks, d in duration_table}  # tick length of each allowed duration
     for im in range(n_measures):
         contents = []
         # Combine events from all three voices into a single list corresponding to the measure
@@ -309,65 +391,52 @@ def measures_to_basic(mchirp_song):
 
             # Extract the notes and rests and put them into a list.
             for e in m.events:
-                if isinstance(e, chirp.Note):
-                    if not e.tied_to:
-                        start_time = e.start_time
-                        for d in base.decompose_duration(e.duration, ppq, basic_durations):
-                            contents.append(BasicNote(start_time, e.note_num, d * ppq, v + 1))
-                            start_time += d * ppq
-                    else:
-                        start_time = e.start_time
-                        for d in base.decompose_duration(e.duration, ppq, basic_durations):
-                            contents.append(BasicRest(start_time, d * ppq, v + 1))
-                            start_time += d * ppq
-                elif isinstance(e, base.Rest):
-                    start_time = e.start_time
-                    for d in base.decompose_duration(e.duration, ppq, basic_durations):
-                        contents.append(BasicRest(start_time, d * ppq, v + 1))
-                        start_time += d * ppq
+                add_events = basic_event_handlers.get(type(e))
+                if add_events is not None:
+                    add_events(contents, e, v + 1, ppq, duration_table, duration_ticks)
 
         # Use the sort order to sort all the events in the measure
         contents.sort(key=sort_order)
-        measure_commands = []
+        measure_parts = []  # Pieces of the PLAY string for this measure
         # Last voice gets reset at the start of each measure.
         last_voice = 0
         for e in contents:
             #  We only care about notes and rests.  For now.
             if isinstance(e, BasicNote):
-                d_name = duration_to_basic_name(e.duration, mchirp_song.metadata.ppq)
                 note_name, octave = pitch_to_basic_note_name(e.note_num)
-                current_command = []  # Build the command for this note
                 if e.voice != last_voice:
-                    current_command.append(' v%d' % e.voice)
+                    measure_parts.append(f' v{e.voice}')
                 if octave != last_octave:
-                    current_command.append('o%s' % octave)
+                    measure_parts.append(f'o{octave}')
                 if e.duration != last_duration:
-                    current_command.append(d_name)
-                current_command.append(note_name.lower())
-                measure_commands.append(''.join(current_command))
+                    measure_parts.append(duration_to_basic_name(e.duration, ppq))
+                measure_parts.append(note_name)
                 # Set all the state variables
                 last_voice = e.voice
                 last_octave = octave
                 last_duration = e.duration
             elif isinstance(e, BasicRest):
-                d_name = duration_to_basic_name(e.duration, mchirp_song.metadata.ppq)
-                current_command = []
                 if e.voice != last_voice:
-                    current_command.append(' v%d' % e.voice)
+                    measure_parts.append(f' v{e.voice}')
                 if e.duration != last_duration:
-                    current_command.append(d_name)
-                current_command.append('r')
-                measure_commands.append(''.join(current_command))
+                    measure_parts.append(duration_to_basic_name(e.duration, ppq))
+                measure_parts.append('r')
                 # Set the state variables
                 last_voice = e.voice
                 last_duration = e.duration
 
-        finished_basic_line = (''.join(measure_commands) + ' m').strip()
+        measure_parts.append(' m')
+        finished_basic_line = ''.join(measure_parts).strip()
         commands.append(finished_basic_line)
 
     return commands
 
 
+# All 676 two-letter BASIC variable names, aa through zz, in measure number order
+str_var_names = tuple(a + b for a in string.ascii_lowercase for b in string.ascii_lowercase)
+str_var_names_upper = tuple(name.upper() for name in str_var_names)
+
+
 def num_to_str_name(num, upper=False):
     """
     Convert measure number to a BASIC variable name
@@ -382,8 +451,5 @@ def num_to_str_name(num, upper=False):
     if num < 0 or num > 675:
         raise ChiptuneSAKValueError("number to convert to str var name out of range")
     if upper:
-        offset = ord('A')
-    else:
-        offset = ord('a')
-    str_name = chr((num // 26) + offset) + chr((num % 26) + offset)
-    return str_name
+        return str_var_names_upper[num]
+    return str_var_names[num]
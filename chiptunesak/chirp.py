@@ -3,7 +3,8 @@
 
 import copy
 import bisect
-import more_itertools as moreit
+import functools
+import numpy as np
 from chiptunesak.base import *
 from chiptunesak import mchirp
 from chiptunesak import rchirp
@@ -15,6 +16,8 @@ class Note:
     This class represents a note in human-friendly form:  as a note with a start time,
     a duration, and a velocity.
     """
+    # Songs hold very many notes; slots make them smaller and their attributes faster to access
+    __slots__ = ('note_num', 'start_time', 'duration', 'velocity', 'tied_from', 'tied_to')
 
     def __init__(self, start, note, duration, velocity=100, tied_from=False, tied_to=False):
         self.note_num = note        #: MIDI note number
@@ -28,6 +31,10 @@ class Note:
         """ Two notes are equal when their note numbers and durations are the same """
         return (self.note_num == other.note_num) and (self.duration == other.duration)
 
+    def __copy__(self):
+        """ Notes are copied often; building the copy directly is much faster than the generic protocol """
+        return Note(self.start_time, self.note_num, self.duration, self.velocity, self.tied_from, self.tied_to)
+
     def split(self, tick_position):
         """
         Splits a note into two notes at time tick_position, if the tick position falls
@@ -52,6 +59,21 @@ class Note:
                % (self.note_num, self.start_time, self.duration, self.velocity, self.tied_from, self.tied_to)
 
 
+def _changes_notes(method):
+    """
+    Decorator for the ChirpTrack and ChirpSong methods that add, remove or move notes.  The song's cached
+    beats (see ChirpSong._cached_beats()) are dropped once the method has run.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            song = getattr(self, 'chirp_song', self)  # Tracks belong to a song; songs stand for themselves
+            song._beats_cache = None
+    return wrapper
+
+
 class ChirpTrack:
     """
     This class represents a track (or a voice) from a song.  It is basically a list of Notes with some
@@ -79,6 +101,7 @@ class ChirpTrack:
             else:
                 self.import_mchirp_track(mchirp_track)
 
+    @_changes_notes
     def import_mchirp_track(self, mchirp_track):
         """
         Imports an  MChirpTrack
@@ -139,14 +162,16 @@ class ChirpTrack:
         :return: tuple of quantization values for (start, duration)
         :rtype: tuple of ints
         """
-        tmpNotes = [n.start_time for n in self.notes]
-        self.qticks_notes = find_quantization(tmpNotes, self.chirp_song.metadata.ppq)
-        tmpNotes = [n.duration for n in self.notes]
-        self.qticks_durations = find_duration_quantization(tmpNotes, self.qticks_notes)
+        n_notes = len(self.notes)
+        starts = np.fromiter((n.start_time for n in self.notes), dtype=np.int64, count=n_notes)
+        self.qticks_notes = find_quantization(starts, self.chirp_song.metadata.ppq)
+        durations = np.fromiter((n.duration for n in self.notes), dtype=np.int64, count=n_notes)
+        self.qticks_durations = find_duration_quantization(durations, self.qticks_notes)
         if self.qticks_durations < self.qticks_notes:
             self.qticks_durations = self.qticks_notes // 2
         return (self.qticks_notes, self.qticks_durations)
 
+    @_changes_notes
     def quantize(self, qticks_notes=None, qticks_durations=None):
         """
         This method applies quantization to both note start times and note durations.  If you
@@ -164,22 +189,20 @@ class ChirpTrack:
         if qticks_durations:
             self.qticks_durations = qticks_durations
 
-        for i, n in enumerate(self.notes):
-            # Store the "before" values for statistics
-            start_before = n.start_time
-            duration_before = n.duration
-            # Quantize the start times and durations
-            n.start_time = quantize_fn(n.start_time, self.qticks_notes)
-            n.duration = quantize_fn(n.duration, self.qticks_durations)
-            # Never quantize a note duration to less than the minimum
-            if n.duration < self.qticks_durations:
-                n.duration = self.qticks_durations
-            self.notes[i] = n
+        # Quantize the start times and durations of all the notes at once
+        starts = quantize_array([n.start_time for n in self.notes], self.qticks_notes)
+        durations = quantize_array([n.duration for n in self.notes], self.qticks_durations)
+        # Never quantize a note duration to less than the minimum
+        durations = np.maximum(durations, self.qticks_durations)
+        for n, start, duration in zip(self.notes, starts.tolist(), durations.tolist()):
+            n.start_time = start
+            n.duration = duration
 
         # Quantize the other MIDI messages in the track
-        for i, m in enumerate(self.other):
-            self.other[i] = OtherMidiEvent(quantize_fn(m.start_time, self.qticks_notes), m.msg)
+        starts = quantize_array([m.start_time for m in self.other], self.qticks_notes)
+        self.other = [OtherMidiEvent(t, m.msg) for t, m in zip(starts.tolist(), self.other)]
 
+    @_changes_notes
     def quantize_long(self, qticks):
         """
         Quantizes only notes longer than 3/4 qticks; quantizes both start time and duration.
@@ -197,6 +220,7 @@ class ChirpTrack:
                 self.notes[i] = n
         self.notes.sort(key=lambda n: (n.start_time, -n.note_num))
 
+    @_changes_notes
     def merge_notes(self, max_merge_length_ticks):
         """
         Merges immediately adjacent notes if they are short and have the same note number.
@@ -219,6 +243,7 @@ class ChirpTrack:
         self.notes = ret_notes
         self.notes.sort(key=lambda n: (n.start_time, -n.note_num))
 
+    @_changes_notes
     def remove_short_notes(self, max_duration_ticks):
         """
          Removes notes shorter than max_duration_ticks from the track.
@@ -233,6 +258,7 @@ class ChirpTrack:
         self.notes = ret_notes
         self.notes.sort(key=lambda n: (n.start_time, -n.note_num))
 
+    @_changes_notes
     def set_min_note_len(self, min_len_ticks):
         """
         Sets the minimum note length for the track.  Notes shorter than min_len_ticks will
@@ -260,6 +286,7 @@ class ChirpTrack:
         self.notes = [n for n in self.notes if n.duration >= min_len_ticks]
         self.notes.sort(key=lambda n: (n.start_time, -n.note_num))  # Notes must be sorted
 
+    @_changes_notes
     def remove_polyphony(self):
         """
         This function eliminates polyphony, so that in each channel there is only one note
@@ -267,18 +294,23 @@ class ChirpTrack:
         note. Otherwise, when a new note is started, the previous note is truncated.
         """
         ret_notes = []
+        in_order = True
         last = self.notes[0]
         for n in self.notes[1:]:
             if n.start_time == last.start_time:
                 continue
             elif n.start_time < last.start_time + last.duration:
+                if n.start_time < last.start_time:
+                    in_order = False
                 last.duration = n.start_time - last.start_time
             if last.duration > 0:
                 ret_notes.append(last)
             last = n
         ret_notes.append(last)
         self.notes = ret_notes
-        self.notes.sort(key=lambda n: (n.start_time, -n.note_num))
+        # Notes that were already in order now have distinct, increasing start times, so they are still sorted
+        if not in_order:
+            self.notes.sort(key=lambda n: (n.start_time, -n.note_num))
 
     def is_polyphonic(self):
         """
@@ -287,7 +319,12 @@ class ChirpTrack:
         :return: True if track is polyphonic.
         :rtype: bool
         """
-        return any(b.start_time - a.start_time < a.duration for a, b in moreit.pairwise(self.notes))
+        last_end = None
+        for n in self.notes:
+            if last_end is not None and n.start_time < last_end:
+                return True
+            last_end = n.start_time + n.duration
+        return False
 
     def is_quantized(self):
         """
@@ -299,10 +336,13 @@ class ChirpTrack:
         """
         if self.qticks_notes < 2 or self.qticks_durations < 2:
             return False
-        return all(n.start_time % self.qticks_notes == 0
-                   and n.duration % self.qticks_durations == 0
-                   for n in self.notes)
+        qticks_notes, qticks_durations = self.qticks_notes, self.qticks_durations
+        for n in self.notes:
+            if n.start_time % qticks_notes != 0 or n.duration % qticks_durations != 0:
+                return False
+        return True
 
+    @_changes_notes
     def remove_keyswitches(self, ks_max=8):
         """
         Removes all MIDI notes with values less than or equal to ks_max. Some MIDI devices
@@ -314,6 +354,7 @@ class ChirpTrack:
         """
         self.notes = [n for n in self.notes if n.note_num > ks_max]
 
+    @_changes_notes
     def truncate(self, max_tick):
         """
         Truncate the track to max_tick
@@ -326,6 +367,7 @@ class ChirpTrack:
         self.program_changes = [p for p in self.program_changes if p.start_time <= max_tick]
         self.other = [e for e in self.other if e.start_time <= max_tick]
 
+    @_changes_notes
     def transpose(self, semitones):
         """
         Transposes track in-place by semitones, which can be positive (transpose up) or
@@ -341,6 +383,7 @@ class ChirpTrack:
                 self.notes[i].duration = 0  # Set duration to zero for later deletion
         self.notes = [n for n in self.notes if n.duration > 0]
 
+    @_changes_notes
     def modulate(self, num, denom):
         """
         Modulates this track metrically by a factor of num / denom
@@ -352,20 +395,18 @@ class ChirpTrack:
         num = f.numerator
         denom = f.denominator
         # Change the start times of all the "other" events
-        for i, (t, m) in enumerate(self.other):
-            t = (t * num) // denom
-            self.other[i] = OtherMidiEvent(t, m)
+        self.other = [OtherMidiEvent((t * num) // denom, m) for t, m in self.other]
 
         # Change all the note start times and durations
-        for i, n in enumerate(self.notes):
+        for n in self.notes:
             n.start_time = (n.start_time * num) // denom
             n.duration = (n.duration * num) // denom
-            self.notes[i] = n
         # Now adjust the quantizations in case quantization has been applied to reflect the
         # new lengths
         self.qticks_notes = (self.qticks_notes * num) // denom
         self.qticks_durations = (self.qticks_durations * num) // denom
 
+    @_changes_notes
     def scale_ticks(self, scale_factor):
         """
         Scales the ticks for this track by scale_factor.
@@ -386,6 +427,7 @@ class ChirpTrack:
         self.qticks_notes = int(round(self.qticks_notes * scale_factor, 0))
         self.qticks_durations = int(round(self.qticks_durations * scale_factor, 0))
 
+    @_changes_notes
     def move_ticks(self, offset_ticks):
         """
         Moves all the events in this track by offset_ticks.  Any events that would have a time
@@ -443,6 +485,7 @@ class ChirpSong(ChiptuneSAKBase):
         self.time_signature_changes = []  #: List of time signature changes
         self.key_signature_changes = []  #: List of key signature changes
         self.tempo_changes = []  #: List of tempo changes
+        self._beats_cache = None  # Cached result of measures_and_beats()
         if mchirp_song is not None:
             if mchirp_song.cts_type() != 'MChirp':
                 raise ChiptuneSAKTypeError("ChirpSong init can only import MChirpSong objects")
@@ -464,6 +507,7 @@ class ChirpSong(ChiptuneSAKBase):
         self.time_signature_changes = []  #: List of time signature changes
         self.key_signature_changes = []  #: List of key signature changes
         self.tempo_changes = []  #: List of tempo changes
+        self._beats_cache = None  # Cached result of measures_and_beats()
 
     def to_rchirp(self, **kwargs):
         """
@@ -487,6 +531,7 @@ class ChirpSong(ChiptuneSAKBase):
         self.set_metadata()
         return mchirp.MChirpSong(self)
 
+    @_changes_notes
     def import_mchirp_song(self, mchirp_song):
         """
         Imports an MChirpSong
@@ -566,10 +611,11 @@ class ChirpSong(ChiptuneSAKBase):
         duration quantization, so in that case the default is half the note start quantization.
         These values are easily overridden.
         """
-        tmp_notes = [n.start_time for t in self.tracks for n in t.notes]
-        self.qticks_notes = find_quantization(tmp_notes, self.metadata.ppq)
-        tmp_durations = [n.duration for t in self.tracks for n in t.notes]
-        self.qticks_durations = find_duration_quantization(tmp_durations, self.qticks_notes)
+        n_notes = sum(len(t.notes) for t in self.tracks)
+        starts = np.fromiter((n.start_time for t in self.tracks for n in t.notes), dtype=np.int64, count=n_notes)
+        self.qticks_notes = find_quantization(starts, self.metadata.ppq)
+        durations = np.fromiter((n.duration for t in self.tracks for n in t.notes), dtype=np.int64, count=n_notes)
+        self.qticks_durations = find_duration_quantization(durations, self.qticks_notes)
         if self.qticks_durations < self.qticks_notes:
             self.qticks_durations = self.qticks_notes // 2
         return (self.qticks_notes, self.qticks_durations)
@@ -593,15 +639,10 @@ class ChirpSong(ChiptuneSAKBase):
         for t in self.tracks:
             t.quantize(self.qticks_notes, self.qticks_durations)
 
-        for i, m in enumerate(self.tempo_changes):
-            self.tempo_changes[i] = TempoEvent(quantize_fn(m.start_time, self.qticks_notes), m.qpm)
-        for i, m in enumerate(self.time_signature_changes):
-            self.time_signature_changes[i] = \
-                TimeSignatureEvent(quantize_fn(m.start_time, self.qticks_notes), m.num, m.denom)
-        for i, m in enumerate(self.key_signature_changes):
-            self.key_signature_changes[i] = KeySignatureEvent(quantize_fn(m.start_time, self.qticks_notes), m.key)
-        for i, m in enumerate(self.other):
-            self.other[i] = OtherMidiEvent(quantize_fn(m.start_time, self.qticks_notes), m.msg)
+        # Only the start times change, so quantize them together and keep the rest of each event
+        for events in (self.tempo_changes, self.time_signature_changes, self.key_signature_changes, self.other):
+            starts = quantize_array([e.start_time for e in events], self.qticks_notes)
+            events[:] = [e._replace(start_time=t) for t, e in zip(starts.tolist(), events)]
 
     def quantize_from_note_name(self, min_note_duration_string, dotted_allowed=False, triplets_allowed=False):
         """
@@ -623,7 +664,8 @@ class ChirpSong(ChiptuneSAKBase):
         if '-3' in min_note_duration_string:
             triplets_allowed = True
             min_note_duration_string = min_note_duration_string.replace('-3', '')
-        qticks = int(self.metadata.ppq * constants.DURATION_STR[min_note_duration_string])
+        duration = constants.DURATION_STR[min_note_duration_string]
+        qticks = self.metadata.ppq * duration.numerator // duration.denominator
         if dotted_allowed:
             qticks //= 2
         if triplets_allowed:
@@ -639,6 +681,7 @@ class ChirpSong(ChiptuneSAKBase):
         """
         return all(t.is_quantized() for t in self.tracks)
 
+    @_changes_notes
     def explode_polyphony(self, i_track):
         """
         'Explodes' a single track into multi-track polyphony.  The new tracks replace the old
@@ -777,13 +820,9 @@ class ChirpSong(ChiptuneSAKBase):
             t, k = ks
             self.key_signature_changes[i] = KeySignatureEvent((t * num) // denom, k)
         # Next the tempos
-        for i, tm in enumerate(self.tempo_changes):
-            t, qpm = tm
-            self.tempo_changes[i] = TempoEvent((t * num) // denom, (qpm * num) // denom)
+        self.tempo_changes = [TempoEvent((t * num) // denom, (qpm * num) // denom) for t, qpm in self.tempo_changes]
         # Now all the rest of the meta messages
-        for i, ms in enumerate(self.other):
-            t, m = ms
-            self.other[i] = OtherMidiEvent((t * num) // denom, m)
+        self.other = [OtherMidiEvent((t * num) // denom, m) for t, m in self.other]
         # Finally, modulate each track
         for i, _ in enumerate(self.tracks):
             self.tracks[i].modulate(num, denom)
@@ -894,7 +933,15 @@ class ChirpSong(ChiptuneSAKBase):
         :return: Time (in ticks) of the end of the last note in the song.
         :rtype: int
         """
-        return max(n.start_time + n.duration for t in self.tracks for n in t.notes)
+        end_time = None
+        for t in self.tracks:
+            for n in t.notes:
+                note_end = n.start_time + n.duration
+                if end_time is None or note_end > end_time:
+                    end_time = note_end
+        if end_time is None:
+            raise ChiptuneSAKValueError("Song has no notes")
+        return end_time
 
     def measure_starts(self):
         """
@@ -903,38 +950,81 @@ class ChirpSong(ChiptuneSAKBase):
         :return: List of measure starting times in MIDI ticks
         :rtype: list
         """
-        return [m.start_time for m in self.measures_and_beats() if m.beat == 1]
+        measure_beats, beat_starts = self._cached_beats()
+        return [t for t, m in zip(beat_starts, measure_beats) if m.beat == 1]
 
     def measures_and_beats(self):
         """
         Returns the positions of all measures and beats in the song.  Calculated using time_signature_changes.
 
+        :return: List of MeasureBeat objects for each beat of the song.
+        :rtype: list
+        """
+        return list(self._cached_beats()[0])
+
+    def _cached_beats(self):
+        """
+        Returns the beats of the song and a parallel list of their start times.  The result is reused
+        until the ppq or the time signature changes change, or the tracks are edited.  The song and
+        track methods that change notes drop the cached beats; the cache key also catches notes or
+        tracks being added or removed directly.  Code that moves notes in place by other means must
+        set self._beats_cache to None.
+
+        :return: (list of Beats, list of beat start times)
+        :rtype: tuple
+        """
+        cache_key = (self.metadata.ppq, tuple(self.time_signature_changes),
+                     tuple((id(t.notes), len(t.notes)) for t in self.tracks))
+        if self._beats_cache is None or self._beats_cache[0] != cache_key:
+            beats = self._make_measures_and_beats(self.end_time())
+            self._beats_cache = (cache_key, beats, [b.start_time for b in beats])
+        return self._beats_cache[1:]
+
+    def _make_measures_and_beats(self, max_time):
+        """
+        Computes the positions of all measures and beats up to max_time from the time signature changes.
+
+        :param max_time: Time of the end of the song, in MIDI ticks
+        :type max_time: int
         :return: List of MeasureBeat objects for each beat of the song.
         :rtype: list
         """
         measures = []
-        max_time = self.end_time()
         time_signature_changes = sorted(self.time_signature_changes)
         if len(time_signature_changes) == 0 or time_signature_changes[0].start_time != 0:
             raise ChiptuneSAKValueError("No starting time signature")
-        last = time_signature_changes[0]
         t, m, b = 0, 1, 1
-        for s in time_signature_changes:
-            while t < s.start_time:
+
+        def _add_beats(time_signature, end):
+            """
+            Adds the beats from the current position up to (but not including) end.  The beat times
+            and their measure and beat numbers are computed directly rather than stepped one at a time.
+            """
+            nonlocal t, m, b
+            step = (self.metadata.ppq * 4) // time_signature.denom
+            times = range(t, end, step)
+            if len(times) == 0:
+                return
+            if b > time_signature.num:
+                # A time signature change shortened the current measure; its next beat starts a new measure
                 measures.append(Beat(t, m, b))
-                t += (self.metadata.ppq * 4) // last.denom
-                b += 1
-                if b > last.num:
-                    m += 1
-                    b = 1
+                t, m, b = t + step, m + 1, 1
+                times = range(t, end, step)
+            beat0 = b - 1  # zero-based beat within the measure
+            num = time_signature.num
+            n_beats = beat0 + len(times)
+            beat_indexes = range(beat0, n_beats)
+            measures.extend(map(Beat._make, zip(times, [m + k // num for k in beat_indexes],
+                                                [k % num + 1 for k in beat_indexes])))
+            t += len(times) * step
+            m += n_beats // num
+            b = n_beats % num + 1
+
+        last = time_signature_changes[0]
+        for s in time_signature_changes:
+            _add_beats(last, s.start_time)
             last = s
-        while t <= max_time:
-            measures.append(Beat(t, m, b))
-            t += (self.metadata.ppq * 4) // last.denom
-            b += 1
-            if b > last.num:
-                m += 1
-                b = 1
+        _add_beats(last, max_time + 1)
         return measures
 
     def get_measure_beat(self, time_in_ticks):
@@ -948,11 +1038,9 @@ class ChirpSong(ChiptuneSAKBase):
         :return:  MeasureBeat object with the current measure and beat
         :rtype: MeasureBeat
         """
-        measure_beats = self.measures_and_beats()
-        # Make a list of start times from the list of measure-beat times.
-        tmp = [m.start_time for m in measure_beats]
+        measure_beats, beat_starts = self._cached_beats()
         # Find the index of the desired time in the list.
-        pos = bisect.bisect_right(tmp, time_in_ticks)
+        pos = bisect.bisect_right(beat_starts, time_in_ticks)
         # Return the corresponding measure/beat
         return measure_beats[pos - 1]
 
@@ -965,12 +1053,11 @@ class ChirpSong(ChiptuneSAKBase):
         :return: Active time signature at the time
         :rtype: TimeSignatureChange
         """
-        itime = 0
         if len(self.time_signature_changes) == 0 or self.time_signature_changes[0].start_time != 0:
             raise ChiptuneSAKValueError("No starting time signature")
-        n_time_signature_changes = len(self.time_signature_changes)
-        while itime < n_time_signature_changes and self.time_signature_changes[itime].start_time < time_in_ticks:
-            itime += 1
+        # The changes are sorted by time; a 1-tuple sorts before any change at the same time, so this
+        # finds the number of changes that start before time_in_ticks.
+        itime = bisect.bisect_left(self.time_signature_changes, (time_in_ticks,))
         return self.time_signature_changes[itime - 1]
 
     def get_active_key_signature(self, time_in_ticks):
@@ -982,12 +1069,10 @@ class ChirpSong(ChiptuneSAKBase):
         :return: Key signature active at the time
         :rtype: KeySignatureChange
         """
-        ikey = 0
         if len(self.key_signature_changes) == 0 or self.key_signature_changes[0].start_time != 0:
             raise ChiptuneSAKValueError("No starting time signature")
-        n_key_signature_changes = len(self.key_signature_changes)
-        while ikey < n_key_signature_changes and self.key_signature_changes[ikey].start_time < time_in_ticks:
-            ikey += 1
+        # Only the start times are ever compared, so the keys themselves need not be orderable
+        ikey = bisect.bisect_left(self.key_signature_changes, (time_in_ticks,))
         return self.key_signature_changes[ikey - 1]
 
 
@@ -1018,14 +1103,18 @@ def objective_error(note_start_times, test_quantization):
     given quantization in ticks.  The function used here could be a sum, RMS, or other
     statistic, but empirical tests indicate that the max used here works well and is robust.
 
+    The quantization errors for all the notes are computed at once with numpy; the result is the same
+    as taking the max of quantization_error() over the notes.
+
     :param note_start_times: note start times in ticks
-    :type note_start_times: list of int
+    :type note_start_times: list or numpy array of int
     :param test_quantization: test quantization, in ticks
     :type test_quantization: int
     :return: objective error function value
     :rtype: int
     """
-    return max(quantization_error(n, test_quantization) for n in note_start_times)
+    remainders = np.asarray(note_start_times) % test_quantization
+    return int(np.minimum(remainders, test_quantization - remainders).max())
 
 
 def find_quantization(time_series, ppq):
@@ -1048,13 +1137,15 @@ def find_quantization(time_series, ppq):
     because performed music rarely has clean note cutoffs.
 
     :param time_series: a series times, usually note start times, in ticks
-    :type time_series: list of int
+    :type time_series: list or numpy array of int
     :param ppq: ppq value (ticks per quarter note)
     :type ppq: int
     :return: quantization in ticks
     :rtype: int
     """
     last_err = len(time_series) * ppq
+    # Chords and repeated rhythms produce many identical times; each only needs to be checked once
+    time_series = np.unique(np.asarray(time_series))
     last_q = ppq
     note_value = 4
     while note_value <= 128:  # We have arbitrarily chosen 128th notes as the fastest possible
@@ -1092,13 +1183,13 @@ def find_duration_quantization(durations, qticks_note):
     The algorithm starts from the estimated quantization for note starts.
 
     :param durations: durations from which to estimate quantization
-    :type durations: list of int
+    :type durations: list or numpy array of int
     :param qticks_note: quantization already determined for note start times
     :type qticks_note: int
     :return: estimated duration quantization, in ticks
     :rtype: int
     """
-    min_length = min(durations)
+    min_length = np.asarray(durations).min().item()
     if not (min_length > 0):
         raise ChiptuneSAKQuantizationError("Illegal minimum note length (%d)" % min_length)
     current_q = qticks_note
@@ -1115,6 +1206,24 @@ def find_duration_quantization(durations, qticks_note):
     return current_q
 
 
+def quantize_array(times, qticks):
+    """
+    Quantizes an array of times or durations at once.  Each value snaps to the nearest quantized
+    value, with ties going to the lower one, using the same comparison as quantize_fn().
+
+    :param times: start times or durations, in ticks
+    :type times: list or numpy array of int
+    :param qticks: quantization in ticks
+    :type qticks: int
+    :return: quantized start times or durations
+    :rtype: numpy array of int
+    """
+    times = np.asarray(times)
+    lower = times // qticks * qticks
+    upper = lower + qticks
+    return np.where(np.abs(times - lower) <= np.abs(upper - times), lower, upper)
+
+
 def quantize_fn(t, qticks):
     """
     This function quantizes a time or duration to a certain number of ticks.  It snaps to the
@@ -1127,11 +1236,11 @@ def quantize_fn(t, qticks):
     :return: quantized start time or duration
     :rtype: int
     """
-    current = t // qticks
-    next = current + 1
-    current *= qticks
-    next *= qticks
-    if abs(t - current) <= abs(next - t):
-        return current
+    lower = t // qticks
+    upper = lower + 1
+    lower *= qticks
+    upper *= qticks
+    if abs(t - lower) <= abs(upper - t):
+        return lower
     else:
-        return next
+        return upper
@@ -4,6 +4,7 @@
 import os
 from fractions import Fraction
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
 from math import log2
 from chiptunesak.errors import *
@@ -77,6 +78,8 @@ BASIC_LINE_MAX_VIC20 = 88  # 4 lines of 22 col
 BASIC_LINE_MAX_C128 = 160  # 4 lines of 40 col
 
 
+# The derived values are computed on first use and then stored in the instance __dict__; cached_property
+# writes there directly, so it works on the frozen dataclass.
 @dataclass(frozen=True)
 class ArchDescription:
     system_clock: int
@@ -84,20 +87,20 @@ class ArchDescription:
     lines_per_frame: int
     visible_lines: int
 
-    @property
+    @cached_property
     def cycles_per_frame(self):
         return self.lines_per_frame * self.cycles_per_line
 
-    @property
+    @cached_property
     def frame_rate(self):
         return self.system_clock / self.cycles_per_frame
 
-    @property
+    @cached_property
     # e.g., 'PAL-C64' is ~19.95ms
     def ms_per_frame(self):
         return 1000. / self.frame_rate
 
-    @property
+    @cached_property
     def blank_lines(self):
         return self.lines_per_frame - self.visible_lines
 
@@ -85,13 +85,6 @@ c128_additional_tokens = {
 c128_tokens = {**c64_tokens, **c128_additional_tokens}
 
 
-def ascii_to_petscii(ascii_bytes):
-    result = []
-    for a_byte in ascii_bytes:
-        result.append(ab2pb(a_byte))
-    return bytes(result)
-
-
 # Convert an ascii char to a petscii char
 #
 # This treats lowercase letters as "unshifted", which means that, by default, lowercase
@@ -112,6 +105,14 @@ def ab2pb(ascii_byte):
     return ascii_byte
 
 
+# ascii to petscii translation table, for converting whole byte strings at once with bytes.translate()
+ascii_to_petscii_table = bytes(ab2pb(a_byte) for a_byte in range(256))
+
+
+def ascii_to_petscii(ascii_bytes):
+    return bytes(ascii_bytes.translate(ascii_to_petscii_table))
+
+
 # Find first REM not inside quotes (anything after that is comment, and not tokenized)
 # (Note: REM neuters quotes, and quotes neuters REM)
 def find_1st_rem_outside_quotes(line):
@@ -6,6 +6,8 @@
 from os import path, listdir
 from os.path import isfile, join
 import copy
+import mmap
+import struct
 from dataclasses import dataclass
 from chiptunesak import constants  # import ARCH, C0_MIDI_NUM, project_to_absolute_path
 from chiptunesak import base
@@ -42,6 +44,13 @@ GT_KEY_ON = 0xBF
 GT_OL_RST = 0xFF  # order list restart marker
 GT_PAT_END = 0xFF  # pattern end
 GT_TEMPO_CHNG_CMD = 0x0F
+# Fixed-layout .sng records: header (id, song name, author, copyright, number of subtunes),
+# and instrument (9 parameter bytes followed by the name)
+GT_HEADER_STRUCT = struct.Struct('<4s32s32s32sB')
+GT_INSTR_STRUCT = struct.Struct('<9B16s')
+
+# Legal values for the note byte of a pattern row
+GT_PATTERN_NOTE_VALUES = frozenset(range(GT_NOTE_OFFSET, GT_MAX_NOTE_VALUE + 1)) | {GT_PAT_END}
 
 
 class GoatTracker(base.ChiptuneSAKIO):
@@ -264,23 +273,15 @@ class GtInstrument:
         :return: new GtInstrument instance
         :rtype: GtInstrument
         """
-        if starting_index + GT_INSTR_BYTE_LEN - 1 > len(bytes):
+        if starting_index + GT_INSTR_BYTE_LEN > len(bytes):
             raise ChiptuneSAKValueError("Error: index out of range when instantiating GTInstrument")
 
-        result = cls()
-        result.instr_num = instr_num
-        result.attack_decay = bytes[starting_index + 0]
-        result.sustain_release = bytes[starting_index + 1]
-        result.wave_ptr = bytes[starting_index + 2]
-        result.pulse_ptr = bytes[starting_index + 3]
-        result.filter_ptr = bytes[starting_index + 4]
-        result.vib_speedtable_ptr = bytes[starting_index + 5]
-        result.vib_delay = bytes[starting_index + 6]
-        result.gateoff_timer = bytes[starting_index + 7]
-        result.hard_restart_1st_frame_wave = bytes[starting_index + 8]
-        result.inst_name = get_chars(bytes[starting_index + 9: starting_index + GT_INSTR_BYTE_LEN])
+        (attack_decay, sustain_release, wave_ptr, pulse_ptr, filter_ptr, vib_speedtable_ptr, vib_delay,
+         gateoff_timer, hard_restart_1st_frame_wave, inst_name) = GT_INSTR_STRUCT.unpack_from(bytes, starting_index)
 
-        return result
+        return cls(instr_num, attack_decay, sustain_release, wave_ptr, pulse_ptr, filter_ptr,
+                   vib_speedtable_ptr, vib_delay, gateoff_timer, hard_restart_1st_frame_wave,
+                   get_chars(inst_name))
 
 
 @dataclass
@@ -700,9 +701,11 @@ class GTSong:
         :type input_filename: str
         """
         with open(input_filename, 'rb') as f:
-            sng_bytes = f.read()
-
-        self.import_sng_binary_to_parsed_gt(sng_bytes)
+            if path.getsize(input_filename) == 0:
+                raise ChiptuneSAKContentError("Error: Did not find magic header")
+            # Parse straight from the memory-mapped file rather than reading it all in first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as sng_bytes:
+                self.import_sng_binary_to_parsed_gt(sng_bytes)
 
     def import_sng_binary_to_parsed_gt(self, sng_bytes):
         """
@@ -713,22 +716,16 @@ class GTSong:
         :type sng_bytes: bytes
         """
 
-        header = GtHeader()
-
-        header.id = sng_bytes[0:4]
-
-        if header.id != GT_FILE_HEADER:
+        if sng_bytes[0:4] != GT_FILE_HEADER or len(sng_bytes) < GT_HEADER_STRUCT.size:
             raise ChiptuneSAKContentError("Error: Did not find magic header")
 
-        header.song_name = get_chars(sng_bytes[4:36])
-        header.author_name = get_chars(sng_bytes[36:68])
-        header.copyright = get_chars(sng_bytes[68:100])
-        header.num_subtunes = sng_bytes[100]
+        (header_id, song_name, author_name, copyright, num_subtunes) = GT_HEADER_STRUCT.unpack_from(sng_bytes, 0)
+        header = GtHeader(header_id, get_chars(song_name), get_chars(author_name), get_chars(copyright), num_subtunes)
 
         if header.num_subtunes > GT_MAX_SUBTUNES_PER_SONG:
             raise ChiptuneSAKContentError("Error:  too many subtunes")
 
-        file_index = 101
+        file_index = GT_HEADER_STRUCT.size
         self.headers = header
 
         # From goattracker documentation: (note: doesn't account for stereo sid)
@@ -840,27 +837,28 @@ class GTSong:
         patterns = []
 
         for pattern_num in range(num_patterns):
-            a_pattern = []
             num_rows = sng_bytes[file_index]
             if num_rows > GT_MAX_ROWS_PER_PATTERN:
                 raise ChiptuneSAKContentError("Error: Too many rows in a pattern")
             file_index += 1
-            for row_num in range(num_rows):
-                a_row = GtPatternRow(
-                    note_data=sng_bytes[file_index],
-                    instr_num=sng_bytes[file_index + 1],
-                    command=sng_bytes[file_index + 2],
-                    command_data=sng_bytes[file_index + 3],
-                )
-                if not ((GT_NOTE_OFFSET <= a_row.note_data <= GT_MAX_NOTE_VALUE)
-                        or a_row.note_data == GT_PAT_END):
-                    raise ChiptuneSAKContentError("Error: unexpected note data value")
-                if a_row.instr_num > GT_MAX_INSTR_PER_SONG:
-                    raise ChiptuneSAKValueError("Error: instrument number out of range")
-                if a_row.command > 0x0F:
-                    raise ChiptuneSAKValueError("Error: command number out of range")
-                file_index += 4
-                a_pattern.append(a_row)
+            end_index = file_index + num_rows * 4
+            pattern_bytes = sng_bytes[file_index:end_index]
+            if len(pattern_bytes) != num_rows * 4:
+                raise ChiptuneSAKContentError("Error: pattern data truncated")
+            # Split the pattern's 4-byte rows into columns, so each column gets validated in one pass
+            note_data = pattern_bytes[0::4]
+            instr_nums = pattern_bytes[1::4]
+            commands = pattern_bytes[2::4]
+            command_data = pattern_bytes[3::4]
+            if not GT_PATTERN_NOTE_VALUES.issuperset(note_data):
+                raise ChiptuneSAKContentError("Error: unexpected note data value")
+            if max(instr_nums, default=0) > GT_MAX_INSTR_PER_SONG:
+                raise ChiptuneSAKValueError("Error: instrument number out of range")
+            if max(commands, default=0) > 0x0F:
+                raise ChiptuneSAKValueError("Error: command number out of range")
+            a_pattern = [GtPatternRow(note_data=n, instr_num=i, command=c, command_data=d)
+                         for n, i, c, d in zip(note_data, instr_nums, commands, command_data)]
+            file_index = end_index
             patterns.append(a_pattern)
 
         self.patterns = patterns
@@ -906,10 +904,10 @@ class GTSong:
         elif -15 <= transposition <= 14:  # Check that transposition is in allowed range
             transposition += 0xF0  # offset for transpositions
         else:  # Instead of dying, fix transpositions by doing octave offsets until it is within range.
-            while transposition > 14:
-                transposition -= 12
-            while transposition < -15:
-                transposition += 12
+            if transposition > 14:
+                transposition -= 12 * ((transposition - 14 + 11) // 12)
+            else:
+                transposition += 12 * ((-15 - transposition + 11) // 12)
             if not (-15 <= transposition <= 14):
                 raise ChiptuneSAKValueError("Error: bad transposition = %d" % transposition)
             transposition += 0xF0
@@ -182,7 +182,7 @@ class Lilypond(ChiptuneSAKIO):
                 if note_ottava != self.current_ottava:
                     self.current_ottava = note_ottava
                     measure_contents.append("\\ottava #%d" % self.current_ottava)
-                f = Fraction(e.duration / self.ppq).limit_denominator(64)
+                f = limit_fraction(e.duration, self.ppq, 64)
                 if f in lp_durations:
                     measure_contents.append(
                         "%s%s%s" % (lp_pitch_to_note_name(e.note_num, self.current_pitch_set),
@@ -193,7 +193,7 @@ class Lilypond(ChiptuneSAKIO):
                         e.duration, self.ppq))
 
             elif isinstance(e, Rest):
-                f = Fraction(e.duration / self.ppq).limit_denominator(64)
+                f = limit_fraction(e.duration, self.ppq, 64)
                 if f in lp_durations:
                     measure_contents.append("r%s" % (lp_durations[f]))
                 else:
@@ -204,7 +204,7 @@ class Lilypond(ChiptuneSAKIO):
                 for te in e.content:
                     if isinstance(te, Note):
                         te_duration = te.duration * Fraction(3 / 2)
-                        f = Fraction(te_duration / self.ppq).limit_denominator(64)
+                        f = limit_fraction(te_duration, self.ppq, 64)
                         if f in lp_durations:
                             measure_contents.append(
                                 "%s%s%s" % (lp_pitch_to_note_name(te.note_num, self.current_pitch_set),
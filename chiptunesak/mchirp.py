@@ -1,4 +1,6 @@
+import bisect
 import copy
+import itertools
 from chiptunesak.base import *
 from chiptunesak import chirp
 import more_itertools as moreit
@@ -6,7 +8,21 @@ import more_itertools as moreit
 """ Definition and methods for mchirp.MChirpSong representation """
 
 
+def _events_in_range(events, start, end):
+    """
+    Returns the events with start <= start_time < end from a time-sorted list of event namedtuples
+    """
+    return events[bisect.bisect_left(events, (start,)):bisect.bisect_left(events, (end,))]
+
+
 class Measure:
+    # Sort rank of each event type within a measure, in the order the types are checked.  chirp.Note (rank 10)
+    # can't be listed here, because chirp imports this module before it defines Note.
+    _sort_ranks = {
+        Triplet: 10, Rest: 10, MeasureMarker: 0, TimeSignatureEvent: 1, KeySignatureEvent: 2,
+        TempoEvent: 3, ProgramEvent: 4
+    }
+
     @staticmethod
     def _sort_order(c):
         """
@@ -18,24 +34,22 @@ class Measure:
             Other MIDI message(s)
             Notes and rests
         """
+        rank = Measure._sort_ranks.get(type(c))
+        if rank is None:
+            rank = Measure._sort_rank(c)
+        return (c.start_time, rank)
+
+    @staticmethod
+    def _sort_rank(c):
+        """
+        Sort rank for notes and for events whose exact type is not in _sort_ranks, such as subclasses
+        """
         if isinstance(c, chirp.Note):
-            return (c.start_time, 10)
-        elif isinstance(c, Triplet):
-            return (c.start_time, 10)
-        elif isinstance(c, Rest):
-            return (c.start_time, 10)
-        elif isinstance(c, MeasureMarker):
-            return (c.start_time, 0)
-        elif isinstance(c, TimeSignatureEvent):
-            return (c.start_time, 1)
-        elif isinstance(c, KeySignatureEvent):
-            return (c.start_time, 2)
-        elif isinstance(c, TempoEvent):
-            return (c.start_time, 3)
-        elif isinstance(c, ProgramEvent):
-            return (c.start_time, 4)
-        else:
-            return (c.start_time, 5)
+            return 10
+        for event_type, rank in Measure._sort_ranks.items():
+            if isinstance(c, event_type):
+                return rank
+        return 5
 
     def __init__(self, start_time, duration):
         """
@@ -165,24 +179,36 @@ class Measure:
         measure_notes.extend(rests)
         return sorted(measure_notes, key=lambda n: n.start_time)
 
-    def populate(self, track, carry=None):
+    def populate(self, track, carry=None, note_starts=None, measure_number=None):
         """
         Populates a single measure with notes, rests, and other events.
 
         :param track: Track from which events are to be imported
         :param carry: If last note in previous measure is continued in this measure, the note with
             remaining time
+        :param note_starts: Optional list of the start times of track.notes, to avoid rebuilding it for
+            every measure
+        :param measure_number: Optional number of this measure; if not given it is looked up in the song
         :return: Carry note, if last note is to be carried into the next measure.
         """
         ppq = track.chirp_song.metadata.ppq
         end = self.start_time + self.duration
 
+        # Events are collected with their sort key (time, rank) and a sequence number, so the final sort
+        # compares plain tuples and keeps events with equal keys in the order they were added.
+        seq = itertools.count()
+
         # Measure number is obtained from the song.
-        measure_number = track.chirp_song.get_measure_beat(self.start_time).measure
-        self.events.append(MeasureMarker(self.start_time, measure_number))
+        if measure_number is None:
+            measure_number = track.chirp_song.get_measure_beat(self.start_time).measure
+        events = [(self.start_time, 0, next(seq), MeasureMarker(self.start_time, measure_number))]
 
-        # Find all the notes that start in this measure; not the fastest but it works
-        measure_notes = [copy.copy(n) for n in track.notes if self.start_time <= n.start_time < end]
+        # Find all the notes that start in this measure; the track is non-polyphonic, so its notes are in order
+        if note_starts is None:
+            note_starts = [n.start_time for n in track.notes]
+        lo = bisect.bisect_left(note_starts, self.start_time)
+        hi = bisect.bisect_left(note_starts, end, lo)
+        measure_notes = [copy.copy(n) for n in track.notes[lo:hi]]
 
         # Add in carry from previous measure
         if carry is not None:
@@ -198,37 +224,42 @@ class Measure:
 
         measure_notes = self.process_triplets(measure_notes, ppq)
         measure_notes = self.add_rests(measure_notes)
-        self.events.extend(copy.deepcopy(measure_notes))
+        # The notes were copied from the track above, so the measure can keep them as they are
+        events.extend((n.start_time, 10, next(seq), n) for n in measure_notes)
 
-        # Add program changes to measure:
-        for pc in track.program_changes:
-            if self.start_time <= pc.start_time < end:
-                # Leave the time of these messages alone
-                self.events.append(pc)
+        # Add program changes to measure, leaving the time of these messages alone
+        events.extend(
+            (pc.start_time, 4, next(seq), pc)
+            for pc in _events_in_range(track.program_changes, self.start_time, end)
+        )
 
-        # Add any additional track-specific messages to the measure:
-        for m in track.other:
-            if self.start_time <= m.start_time < end:
-                # Leave the time of these messages alone
-                self.events.append(m)
+        # Add any additional track-specific messages to the measure, also leaving their times alone
+        events.extend(
+            (*self._sort_order(m), next(seq), m)
+            for m in _events_in_range(track.other, self.start_time, end)
+        )
 
         #  Now add all the song-specific events to the measure.
-        for ks in track.chirp_song.key_signature_changes:
-            if self.start_time <= ks.start_time < end:
-                # Key signature changes must occur at the start of the measure
-                self.events.append(KeySignatureEvent(self.start_time, ks.key))
-
-        for ts in track.chirp_song.time_signature_changes:
-            if self.start_time <= ts.start_time < end:
-                # Time signature changes must occur at the start of the measure
-                self.events.append(TimeSignatureEvent(self.start_time, ts.num, ts.denom))
-
-        for tm in track.chirp_song.tempo_changes:
-            if self.start_time <= tm.start_time < end:
-                # Tempo changes can happen anywhere in the measure
-                self.events.append(TempoEvent(tm.start_time, tm.qpm))
-
-        self.events = sorted(self.events, key=self._sort_order)
+        # Key signature changes must occur at the start of the measure
+        events.extend(
+            (self.start_time, 2, next(seq), KeySignatureEvent(self.start_time, ks.key))
+            for ks in _events_in_range(track.chirp_song.key_signature_changes, self.start_time, end)
+        )
+
+        # Time signature changes must occur at the start of the measure
+        events.extend(
+            (self.start_time, 1, next(seq), TimeSignatureEvent(self.start_time, ts.num, ts.denom))
+            for ts in _events_in_range(track.chirp_song.time_signature_changes, self.start_time, end)
+        )
+
+        # Tempo changes can happen anywhere in the measure
+        events.extend(
+            (tm.start_time, 3, next(seq), TempoEvent(tm.start_time, tm.qpm))
+            for tm in _events_in_range(track.chirp_song.tempo_changes, self.start_time, end)
+        )
+
+        events.sort()
+        self.events.extend(e[3] for e in events)
 
         return carry
 
@@ -276,9 +307,11 @@ class MChirpTrack:
         measure_starts.append(2 * measure_starts[-1] - measure_starts[-2])
         # First add in the notes to the measure
         carry = None
-        for start, end in moreit.pairwise(measure_starts):
+        note_starts = [n.start_time for n in chirp_track.notes]
+        for im, (start, end) in enumerate(moreit.pairwise(measure_starts)):
             current_measure = Measure(start, end - start)
-            carry = current_measure.populate(chirp_track, carry)
+            # Measures are numbered consecutively from 1
+            carry = current_measure.populate(chirp_track, carry, note_starts, im + 1)
             measures_list.append(current_measure)
         self.measures = measures_list
         self.name = chirp_track.name
@@ -333,11 +366,16 @@ class MChirpSong(ChiptuneSAKBase):
         """
         if len(self.tracks) == 0:
             raise ChiptuneSAKContentError("No tracks in song")
-        while all(t.measures[-1].count_notes() == 0 for t in self.tracks):
-            for t in self.tracks:
-                t.measures.pop()
-                if len(t.measures) == 0:
-                    raise ChiptuneSAKContentError("No measures left in track %s" % t.name)
+        # Trim as many measures as every track has note-free measures at its end
+        n_trim = min(
+            next((i for i, m in enumerate(reversed(t.measures)) if m.count_notes() > 0), len(t.measures))
+            for t in self.tracks
+        )
+        for t in self.tracks:
+            if len(t.measures) <= n_trim:
+                raise ChiptuneSAKContentError("No measures left in track %s" % t.name)
+        for t in self.tracks:
+            del t.measures[len(t.measures) - n_trim:]
 
     def trim_partial_measures(self):
         """
@@ -1,5 +1,6 @@
 import sys
 import mido
+from operator import itemgetter
 from chiptunesak.base import *
 from chiptunesak.chirp import Note, ChirpTrack, ChirpSong
 
@@ -291,31 +292,31 @@ class MIDI(ChiptuneSAKIO):
         Convert  ChirpTrack to a midi track.
         """
         midiTrack = mido.MidiTrack()
-        events = [mido.MetaMessage('track_name', name=chirp_track.name, time=0)]
+        # Each event is stored with its (time, priority) sort key up front, so that sorting compares
+        # plain tuples rather than calling back into Python for every message.
+        events = [(0, 0, mido.MetaMessage('track_name', name=chirp_track.name, time=0))]
         for n in chirp_track.notes:
             # For the sake of sorting, create the midi event with the absolute time (which will be
             # changed to a delta time before returning).
-            if n.note_num < 0 or n.note_num > 127:
-                print(n.note_num)
-            events.append(mido.Message('note_on',
-                                       note=n.note_num, channel=chirp_track.channel,
-                                       velocity=n.velocity, time=n.start_time))
-            events.append(mido.Message('note_off',
-                                       note=n.note_num, channel=chirp_track.channel,
-                                       velocity=0, time=n.start_time + n.duration))
+            end_time = n.start_time + n.duration
+            events.append((n.start_time, 10, mido.Message('note_on',
+                                                          note=n.note_num, channel=chirp_track.channel,
+                                                          velocity=n.velocity, time=n.start_time)))
+            events.append((end_time, 9, mido.Message('note_off',
+                                                     note=n.note_num, channel=chirp_track.channel,
+                                                     velocity=0, time=end_time)))
         for t, program in chirp_track.program_changes:
-            events.append(mido.Message('program_change',
-                                       channel=chirp_track.channel, program=program, time=t))
+            events.append((t, 5, mido.Message('program_change',
+                                              channel=chirp_track.channel, program=program, time=t)))
         for t, msg in chirp_track.other:
             msg.time = t
-            events.append(msg)
+            events.append(sort_midi_events(msg) + (msg,))
         # Because 'note_off' comes before 'note_on' this sort will keep note_off events before
         # note_on events.
-        events.sort(key=sort_midi_events)
+        events.sort(key=itemgetter(0, 1))
         last_time = 0
         # Turn the absolute times into delta times.
-        for msg in events:
-            current_time = msg.time
+        for current_time, _, msg in events:
             msg.time -= last_time
             midiTrack.append(msg)
             last_time = current_time
@@ -1,3 +1,5 @@
+import functools
+import heapq
 from chiptunesak.base import *
 from chiptunesak import chirp, mchirp
 from chiptunesak import constants
@@ -22,28 +24,50 @@ ml64_durations = {
 }
 
 
+@functools.lru_cache(maxsize=8)
+def ml64_duration_table(ppq):
+    """
+    Duration table (see make_duration_table) for the ML64 durations at the given ppq, with each tick
+    length paired with its ML64 duration name so that decompose_duration() returns the names directly
+    """
+    return tuple((ticks, ml64_durations[d]) for ticks, d in make_duration_table(ml64_durations, ppq))
+
+
+# ML64 note names for every MIDI pitch (no octave offset), indexed by note number
+ml64_note_names = tuple(
+    "%s%d" % (constants.PITCHES[n % 12], (n - constants.C0_MIDI_NUM) // 12) for n in range(128)
+)
+
+
 def pitch_to_ml64_note_name(note_num, octave_offset=0):
     """
     Gets note name for a given MIDI pitch
     """
     if not 0 <= note_num <= 127:
         raise ChiptuneSAKValueError("Illegal note number %d" % note_num)
+    if octave_offset == 0:
+        return ml64_note_names[note_num]
     octave_num = ((note_num - constants.C0_MIDI_NUM) // 12) + octave_offset
     pitch = note_num % 12
     return "%s%d" % (constants.PITCHES[pitch], octave_num)
 
 
 def make_ml64_notes(note_name, duration, ppq):
-    durs = decompose_duration(duration, ppq, ml64_durations)
+    durs = decompose_duration(duration, ppq, ml64_durations, ml64_duration_table(ppq))
     if note_name == 'r' or note_name == 'c':
-        retval = ''.join("%s(%s)" % (note_name, ml64_durations[f]) for f in durs)
+        retval = ''.join("%s(%s)" % (note_name, d) for d in durs)
     else:
-        retval = "%s(%s)" % (note_name, ml64_durations[durs[0]])
+        retval = "%s(%s)" % (note_name, durs[0])
         if len(durs) > 1:
-            retval += ''.join("c(%s)" % (ml64_durations[f]) for f in durs[1:])
+            retval += ''.join("c(%s)" % d for d in durs[1:])
     return retval
 
 
+# Sort rank of each event type among events with the same start time, in the order the types are checked;
+# any other type ranks 5
+ml64_sort_ranks = {chirp.Note: 10, Rest: 10, MeasureMarker: 1, TempoEvent: 3, ProgramEvent: 2}
+
+
 def ml64_sort_order(c):
     """
     Sort function for measure contents.
@@ -52,18 +76,53 @@ def ml64_sort_order(c):
      *   Tempo
      *   Notes and rests
     """
-    if isinstance(c, chirp.Note):
-        return (c.start_time, 10)
-    elif isinstance(c, Rest):
-        return (c.start_time, 10)
-    elif isinstance(c, MeasureMarker):
-        return (c.start_time, 1)
-    elif isinstance(c, TempoEvent):
-        return (c.start_time, 3)
-    elif isinstance(c, ProgramEvent):
-        return (c.start_time, 2)
+    rank = ml64_sort_ranks.get(type(c))
+    if rank is None:  # Subclasses rank with their base type
+        rank = next((r for event_type, r in ml64_sort_ranks.items() if isinstance(c, event_type)), 5)
+    return (c.start_time, rank)
+
+
+def add_ml64_note(content, note, ppq, last_continue):
+    """
+    Appends the ML64 for a note to content.  A note that continues the previous one is written as continues.
+    Returns whether the next note continues this one.
+    """
+    if last_continue:
+        content.append(make_ml64_notes('c', note.duration, ppq))
     else:
-        return (c.start_time, 5)
+        content.append(make_ml64_notes(pitch_to_ml64_note_name(note.note_num), note.duration, ppq))
+    return note.tied_from
+
+
+def add_ml64_rest(content, rest, ppq, last_continue):
+    """
+    Appends the ML64 for a rest to content.  Nothing continues past a rest.
+    """
+    content.append(make_ml64_notes('r', rest.duration, ppq))
+    return False
+
+
+def add_ml64_measure_marker(content, marker, ppq, last_continue):
+    """
+    Appends a measure comment to content.
+    """
+    content.append('[m%d]' % marker.measure_number)
+    return last_continue
+
+
+def add_ml64_program(content, program, ppq, last_continue):
+    """
+    Appends an instrument change to content.
+    """
+    content.append('i(%d)' % program.program)
+    return last_continue
+
+
+# Converters from events to ML64, keyed by event type.  Other events are ignored.
+ml64_event_handlers = {
+    chirp.Note: add_ml64_note, Rest: add_ml64_rest, MeasureMarker: add_ml64_measure_marker,
+    ProgramEvent: add_ml64_program
+}
 
 
 def events_to_ml64(events, song, last_continue=False):
@@ -80,22 +139,11 @@ def events_to_ml64(events, song, last_continue=False):
     :rtype: tuple
     """
     content = []
+    ppq = song.metadata.ppq
     for e in events:
-        if isinstance(e, chirp.Note):
-            if last_continue:
-                tmp_note = make_ml64_notes('c', e.duration, song.metadata.ppq)
-            else:
-                tmp_note = make_ml64_notes(pitch_to_ml64_note_name(e.note_num), e.duration, song.metadata.ppq)
-            content.append(tmp_note)
-            last_continue = e.tied_from
-        elif isinstance(e, Rest):
-            tmp_note = make_ml64_notes('r', e.duration, song.metadata.ppq)
-            content.append(tmp_note)
-            last_continue = False
-        elif isinstance(e, MeasureMarker):
-            content.append('[m%d]' % e.measure_number)
-        elif isinstance(e, ProgramEvent):
-            content.append('i(%d)' % e.program)
+        add_event = ml64_event_handlers.get(type(e))
+        if add_event is not None:
+            last_continue = add_event(content, e, ppq, last_continue)
     return (content, last_continue)
 
 
@@ -180,24 +228,25 @@ class ML64(ChiptuneSAKIO):
         output.append('song(1)')
         output.append('tempo(%d)' % chirp_song.metadata.qpm)
 
+        # The measure markers are the same for every track, up to the end of the last note in the song
+        markers = []
+        if mode == 's':  # Add measures for standard format
+            song_end = max((n.start_time + n.duration for t in chirp_song.tracks for n in t.notes), default=0)
+            measures = chirp_song.measure_starts()
+            markers = [MeasureMarker(m, im + 1) for im, m in enumerate(measures) if m < song_end]
+
         for it, t in enumerate(chirp_song.tracks):
             output.append('track(%d)' % (it + 1))
-            track_events = []
+            notes_and_rests = []
             last_note_end = 0
             # Create a list of events for the entire track
             for n in t.notes:
                 if n.start_time > last_note_end:
-                    track_events.append(Rest(last_note_end, n.start_time - last_note_end))
-                track_events.append(n)
+                    notes_and_rests.append(Rest(last_note_end, n.start_time - last_note_end))
+                notes_and_rests.append(n)
                 last_note_end = n.start_time + n.duration
-            track_events.extend(t.program_changes)
-            if mode == 's':  # Add measures for standard format
-                last_note_end = max(n.start_time + n.duration for t in chirp_song.tracks for n in t.notes)
-                measures = [m.start_time for m in chirp_song.measures_and_beats() if m.beat == 1]
-                for im, m in enumerate(measures):
-                    if m < last_note_end:
-                        track_events.append(MeasureMarker(m, im + 1))
-            track_events.sort(key=ml64_sort_order)
+            # Each source is already in time order, so merge them rather than sorting the whole track
+            track_events = list(heapq.merge(notes_and_rests, t.program_changes, markers, key=ml64_sort_order))
             # Now send the entire list of events to the ml64 creator
             track_content, *_ = events_to_ml64(track_events, chirp_song)
             output.append(''.join(track_content).strip())
@@ -359,13 +359,15 @@ class RChirpVoice:
                                 milliframe_len=frames_per_row * 1000,
                                 new_milliframe_tempo=frames_per_row * 1000)
         # Insert the notes into the voice
+        milliframes_per_row = frames_per_row * 1000
         for n in chirp_track.notes:
             n_row = int(n.start_time // ticks_per_row)  # Note: if tempo varies this gets complicated.
-            tmp_rows[n_row].row_num = n_row
-            tmp_rows[n_row].milliframe_num = n_row * frames_per_row * 1000
-            tmp_rows[n_row].note_num = n.note_num
-            tmp_rows[n_row].gate = True
-            tmp_rows[n_row].milliframe_len = frames_per_row * 1000
+            row = tmp_rows[n_row]
+            row.row_num = n_row
+            row.milliframe_num = n_row * milliframes_per_row
+            row.note_num = n.note_num
+            row.gate = True
+            row.milliframe_len = milliframes_per_row
             e_row = int((n.start_time + n.duration) // ticks_per_row)
             tmp_rows[e_row].gate = False
 
@@ -619,10 +621,9 @@ class RChirpSong(ChiptuneSAKBase):
         song.metadata.ppq = constants.DEFAULT_MIDI_PPQN
         song.name = self.metadata.name
         song.set_options(arch=self.arch)  # So that round-trip will return the same arch
-        note_milliframe_nums = [v.rows[r].milliframe_num for v in self.voices
-                                for r in v.rows if v.rows[r].gate is not None]
-        note_milliframe_nums.sort()
-        notes_offset_mf = note_milliframe_nums[0]
+        note_milliframe_nums = {row.milliframe_num for v in self.voices
+                                for row in v.rows.values() if row.gate is not None}
+        notes_offset_mf = min(note_milliframe_nums)
         milliframes_per_quarter = self.get_option('milliframes_per_quarter', None)
 
         if milliframes_per_quarter is None:
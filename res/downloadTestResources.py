@@ -1,15 +1,22 @@
 # Download additional resources that could be used in testing / demonstrations
 # that don't belong in the github code base
 
+import argparse
+import json
 import os
 import time
 import requests
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 from random import uniform
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
 
 from chiptunesak.constants import project_to_absolute_path
 
 SKIP_IF_EXISTS = True
-last_site = None
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
 
 
 class ResourceFile:
@@ -21,51 +28,198 @@ class ResourceFile:
             self.local_name = remote_url.split('/')[-1]
 
 
-def manage_resources(resources):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:75.0) Gecko/20100101 Firefox/75.0'
-    }
-
+def manage_resources(resources, incremental=False):
+    # Resolve (and create) each distinct destination directory once, up front, rather than
+    # once per file from inside the download threads
+    local_paths = {}
     for resource in resources:
-        local_path = project_to_absolute_path(resource.local_path)
-
-        # pathlib would have been better (can build full dir paths), but didn't work for me
-        # pathlib.Path(local_path).parent.mkdir(parents=True, exist_ok=True)
-        # TODO: this approach assumes parent dir exists.  Make a nested directory creator routine
-        # and use it here.
-        os.makedirs(local_path, exist_ok=True)
-
-        local_file = os.path.normpath(os.path.join(local_path, resource.local_name))
-
-        if os.path.exists(local_file):
-            if not os.path.isfile(local_file):
-                raise Exception('Error: not expecting "%s" to not be a file' % (local_file))
-            if SKIP_IF_EXISTS:
-                print('"%s" exists, skipping' % (local_file))
+        if resource.local_path not in local_paths:
+            local_path = project_to_absolute_path(resource.local_path)
+            os.makedirs(local_path, exist_ok=True)
+            local_paths[resource.local_path] = local_path
+
+    # Bucket the resources by host, so that each host gets its own persistent session
+    # (keep-alive connection reuse) and can be downloaded from concurrently with the others
+    buckets = {}
+    for resource in resources:
+        host = urlparse(resource.remote_url).netloc
+        local_file = os.path.join(local_paths[resource.local_path], resource.local_name)
+        buckets.setdefault(host, []).append((resource, local_file))
+    if not buckets:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(buckets)) as executor:
+        futures = [executor.submit(manage_host_resources, host_resources, incremental) for host_resources in buckets.values()]
+        for future in futures:
+            future.result()
+
+
+def manage_host_resources(resources, incremental=False):
+    """
+    Download (resource, local_file) pairs that all live on the same host, sequentially and
+    with a pause between requests, using a single session.
+
+    If incremental is set, existing files are re-checked with a conditional GET using the
+    validators saved from the previous download, and are only re-downloaded if changed.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:75.0) Gecko/20100101 Firefox/75.0'
+    })
+
+    with session:
+        requested = False
+        for resource, local_file in resources:
+            if os.path.exists(local_file):
+                if not os.path.isfile(local_file):
+                    raise Exception('Error: not expecting "%s" to not be a file' % (local_file))
+                if incremental:
+                    print('"%s" exists, checking for changes' % (local_file))
+                elif SKIP_IF_EXISTS:
+                    print('"%s" exists, skipping' % (local_file))
+                    continue
+                else:
+                    print('"%s" exists, will overwrite if changed' % (local_file))
+
+            if requested:
+                time.sleep(uniform(1.5, 2.8))  # be friendly to web sites
+            requested = True
+
+            request_headers = {}
+            if os.path.isfile(local_file):
+                request_headers = conditional_headers(read_validators(local_file)) if incremental else {}
+                # Without saved validators, fall back to a cheap HEAD comparing size and date
+                if not request_headers:
+                    if not needs_download(session, resource.remote_url, local_file):
+                        print('"%s" unchanged, skipping' % (local_file))
+                        continue
+                    time.sleep(uniform(1.5, 2.8))  # the HEAD request just went to the same site
+
+            print("%s -> %s" % (resource.remote_url, local_file))
+            try:
+                response = session.get(resource.remote_url, headers=request_headers, stream=True, timeout=30)
+            except requests.exceptions.RequestException as e:
+                print('Unable to download file at "%s", due to exception "%s"' % (resource.remote_url, e))
                 continue
-            else:
-                print('Will overwrite "%s"' % (local_file))
-
-        print("%s -> %s" % (resource.remote_url, local_file))
-        try:
-            response = requests.get(resource.remote_url, headers=headers)
-        except requests.exceptions.RequestException as e:
-            print('Unable to download file at "%s", due to exception "%s"' % (resource.remote_url, e))
-            continue
 
-        content = response.content
+            if response.status_code == 304:
+                response.close()
+                print('"%s" unchanged, skipping' % (local_file))
+                continue
 
-        if b'<html' in content.lower()[0:200]:
-            print('Warning: "%s" might merely be HTML saying the equivalent of "no botz allowed"' % (local_file))
+            # Stream the body to a temporary file in chunks rather than holding the whole file in memory.
+            # It only replaces local_file once complete, so an interrupted download leaves no truncated file.
+            part_file = local_file + '.part'
+            try:
+                # None of the resources are web pages, so an HTML response is (most likely) a page saying
+                # the equivalent of "no botz allowed".  Check before writing anything to disk.
+                with response:
+                    if response.headers.get('Content-Type', '').startswith('text/html'):
+                        print('Warning: skipping "%s", server returned HTML (%d %s)'
+                              % (local_file, response.status_code, response.reason))
+                        continue
+
+                    chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+                    first_chunk = next(chunks, b'')
+                    start = first_chunk[0:200].lower()
+                    if b'<html' in start or b'<!doctype html' in start:
+                        print('Warning: skipping "%s", response looks like HTML (%d %s)'
+                              % (local_file, response.status_code, response.reason))
+                        continue
+
+                    with open(part_file, 'wb', buffering=DOWNLOAD_BUFFER_SIZE) as out_file:
+                        out_file.write(first_chunk)
+                        for chunk in chunks:
+                            out_file.write(chunk)
+            except requests.exceptions.RequestException as e:
+                print('Unable to download file at "%s", due to exception "%s"' % (resource.remote_url, e))
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+                continue
+            os.replace(part_file, local_file)
+
+            last_modified = http_date_to_timestamp(response.headers.get('Last-Modified'))
+            if last_modified is not None:
+                os.utime(local_file, (last_modified, last_modified))
+
+            if incremental:
+                write_validators(local_file, response.headers)
+
+
+def needs_download(session, url, local_file):
+    """
+    Issues a HEAD request for url and compares its Content-Length and Last-Modified headers
+    against the size and modification time of local_file.  Returns False only if both match.
+    """
+    try:
+        r = session.head(url, allow_redirects=True, timeout=10)
+    except requests.exceptions.RequestException:
+        return True
+    if not r.ok:
+        return True
+
+    remote_size = int(r.headers.get('Content-Length', -1))
+    remote_mtime = http_date_to_timestamp(r.headers.get('Last-Modified'))
+    if remote_size != os.path.getsize(local_file) or remote_mtime is None:
+        return True
+    return int(remote_mtime) != int(os.path.getmtime(local_file))
+
+
+def http_date_to_timestamp(http_date):
+    """
+    Converts an HTTP date header value to a POSIX timestamp, or None if it cannot be parsed
+    """
+    if not http_date:
+        return None
+    try:
+        return parsedate_to_datetime(http_date).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def validators_file(local_file):
+    return local_file + '.etag.json'
+
+
+def read_validators(local_file):
+    """
+    Returns the ETag / Last-Modified headers saved alongside local_file, or an empty dict
+    if there are none.
+    """
+    try:
+        with open(validators_file(local_file), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_validators(local_file, response_headers):
+    validators = {
+        'ETag': response_headers.get('ETag'),
+        'Last-Modified': response_headers.get('Last-Modified'),
+    }
+    with open(validators_file(local_file), 'w') as f:
+        json.dump(validators, f)
 
-        with open(local_file, 'wb') as out_file:
-            out_file.write(content)
 
-        time.sleep(uniform(1.5, 2.8))  # be friendly to web sites
-        print()
+def conditional_headers(validators):
+    headers = {}
+    if validators.get('ETag'):
+        headers['If-None-Match'] = validators['ETag']
+    if validators.get('Last-Modified'):
+        headers['If-Modified-Since'] = validators['Last-Modified']
+    return headers
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Download additional test and example resources.")
+    parser.add_argument('-i', '--incremental', action="store_true",
+                        help='re-check existing files, only downloading those that changed on the server')
+    args = parser.parse_args()
+
     resources = []
 
     # C64 ROMs
@@ -153,7 +307,7 @@ def main():
         'http://youdzone.com/testData/msdos/betrayalKrondorMercantile.mid',
         'examples/data/mercantile'))
 
-    manage_resources(resources)
+    manage_resources(resources, args.incremental)
 
     print("\nDone")
 
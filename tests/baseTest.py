@@ -1,7 +1,11 @@
 import unittest
 
+from fractions import Fraction
+
 from chiptunesak import constants
 from chiptunesak.base import note_name_to_pitch, pitch_to_note_name
+from chiptunesak.base import limit_fraction, make_duration_table, decompose_duration
+from chiptunesak.errors import ChiptuneSAKValueError
 
 
 class BaseTestCase(unittest.TestCase):
@@ -30,6 +34,34 @@ class BaseTestCase(unittest.TestCase):
         self.assertEqual(constants.DURATIONS['US'][constants.DURATION_STR['4.']], 'dotted quarter')
         self.assertEqual(constants.DURATIONS['UK'][constants.DURATION_STR['32']], 'demisemiquaver')
 
+    def test_limit_fraction(self):
+        ppq = 960
+        for duration in (1, 240, 320, 960, 1440, 1000, 7):
+            expected = Fraction(duration / ppq).limit_denominator(64)
+            self.assertEqual(limit_fraction(duration, ppq, 64), expected)
+        # A repeated call is answered from the cache, with the same value
+        hits = limit_fraction.cache_info().hits
+        self.assertEqual(limit_fraction(320, ppq, 64), Fraction(1, 3))
+        self.assertEqual(limit_fraction.cache_info().hits, hits + 1)
+
+    def test_decompose_duration(self):
+        ppq = 480
+        allowed_durations = {Fraction(4, 1), Fraction(3, 1), Fraction(2, 1), Fraction(1, 1),
+                             Fraction(1, 2), Fraction(3, 8), Fraction(1, 4)}
+        duration_table = make_duration_table(allowed_durations, ppq)
+        self.assertEqual([d for _, d in duration_table], sorted(allowed_durations, reverse=True))
+        self.assertEqual(duration_table[-1], (120, Fraction(1, 4)))
+        self.assertTrue(all(isinstance(ticks, int) for ticks, _ in duration_table))
+
+        # Decomposing with a precomputed table matches decomposing without one
+        for duration in range(120, 8 * ppq, 120):
+            expected = decompose_duration(duration, ppq, allowed_durations)
+            self.assertEqual(decompose_duration(duration, ppq, allowed_durations, duration_table), expected)
+            self.assertEqual(sum(expected) * ppq, duration)
+
+        with self.assertRaises(ChiptuneSAKValueError):
+            decompose_duration(130, ppq, allowed_durations, duration_table)
+
     def test_octave_offsets(self):
         octave_offset = 0
         self.assertEqual('G4', pitch_to_note_name(67, octave_offset))
@@ -6,6 +6,7 @@
 import unittest
 from chiptunesak import goat_tracker
 from chiptunesak import base
+from chiptunesak.errors import ChiptuneSAKContentError
 from chiptunesak.constants import project_to_absolute_path
 from chiptunesak.byte_util import read_binary_file
 
@@ -84,6 +85,12 @@ class TestGoatTrackerFunctions(unittest.TestCase):
         # write_binary_file(project_to_absolute_path('tests/data/gtTestData_deleteMe.sng'), gt_binary2)
         self.assertTrue(self.gt_binary == gt_binary2)
 
+    # Test that a .sng binary whose last pattern is cut short is rejected
+    def test_sng_truncated_pattern(self):
+        truncated_song = goat_tracker.GTSong()
+        with self.assertRaises(ChiptuneSAKContentError):
+            truncated_song.import_sng_binary_to_parsed_gt(self.gt_binary[:-3])
+
     # Test that .sng binary to rchirp has expected note content after conversion
     def test_sng_to_rchirp(self):
         rchirp_song = self.parsed_gt.import_parsed_gt_to_rchirp(0)